@@ -3,9 +3,14 @@
 # Exposes: analyze_event_ai(event_id, event_payload=None, event_meta=None) -> dict
 
 import os
+import re
 import time
 import json
+import hashlib
 import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 
 logger = logging.getLogger("ai_router")
 
@@ -16,9 +21,131 @@ except Exception:
     openai = None
     logger.info("openai package not available; falling back to local heuristic")
 
+# orjson is optional: faster encode/decode for prompt payloads and model output
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+def _jdumps(obj):
+    """JSON text for prompts (non-ASCII kept as-is, unknown types via str)."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str).decode()
+    return json.dumps(obj, ensure_ascii=False, default=str)
+
+def _jloads(text):
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
 # default model (override with OPENAI_MODEL env var)
 DEFAULT_OPENAI_MODEL = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
 
+# Bounds for the OpenAI call: per-request timeout (s), SDK retries (exponential backoff),
+# and how many calls may be in flight per process before we shed to the local heuristic.
+OPENAI_TIMEOUT = float(os.environ.get("OPENAI_TIMEOUT", "20"))
+OPENAI_MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", "3"))
+OPENAI_MAX_CONCURRENCY = int(os.environ.get("OPENAI_MAX_CONCURRENCY", "10"))
+_openai_slots = threading.BoundedSemaphore(OPENAI_MAX_CONCURRENCY)
+
+# Prompt budget: long list fields (stack frames, log lines) keep their first PROMPT_MAX_ITEMS
+# entries, and the serialized payload is clipped to PROMPT_MAX_CHARS before it is sent.
+PROMPT_MAX_ITEMS = int(os.environ.get("PROMPT_MAX_ITEMS", "20"))
+PROMPT_MAX_CHARS = int(os.environ.get("PROMPT_MAX_CHARS", "8000"))
+
+def _trim_payload(obj):
+    if isinstance(obj, dict):
+        return {k: _trim_payload(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_trim_payload(v) for v in obj[:PROMPT_MAX_ITEMS]]
+    return obj
+
+_client = None
+_client_key = None
+_client_lock = threading.Lock()
+
+def _get_client(key):
+    """Return a shared OpenAI client (rebuilt only if the API key changes)."""
+    global _client, _client_key
+    with _client_lock:
+        if _client is None or _client_key != key:
+            _client = openai.OpenAI(api_key=key, timeout=OPENAI_TIMEOUT, max_retries=OPENAI_MAX_RETRIES)
+            _client_key = key
+        return _client
+
+# Content-addressed cache of OpenAI results: identical payloads recur constantly in log pipelines.
+# Per-process LRU with TTL; keyed by model + canonical JSON of (payload, meta), not by event id.
+AI_CACHE_SIZE = int(os.environ.get("AI_CACHE_SIZE", "4096"))
+AI_CACHE_TTL = float(os.environ.get("AI_CACHE_TTL", "3600"))
+_ai_cache = OrderedDict()
+_ai_cache_lock = threading.Lock()
+
+def _cache_key(event_payload, event_meta):
+    if not event_payload:
+        return None  # nothing content-specific to key on
+    model = os.environ.get("OPENAI_MODEL", DEFAULT_OPENAI_MODEL)
+    if orjson is not None:
+        blob = orjson.dumps([model, event_payload, event_meta], option=orjson.OPT_SORT_KEYS, default=str)
+    else:
+        blob = json.dumps([model, event_payload, event_meta], sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()
+
+def _cache_get(key):
+    with _ai_cache_lock:
+        hit = _ai_cache.get(key)
+        if hit is None:
+            return None
+        stored_at, res = hit
+        if time.time() - stored_at > AI_CACHE_TTL:
+            del _ai_cache[key]
+            return None
+        _ai_cache.move_to_end(key)
+        return dict(res)
+
+def _cache_put(key, res):
+    with _ai_cache_lock:
+        _ai_cache[key] = (time.time(), dict(res))
+        _ai_cache.move_to_end(key)
+        while len(_ai_cache) > AI_CACHE_SIZE:
+            _ai_cache.popitem(last=False)
+
+# Local triage rules in priority order: (keyword alternation, suggestion).
+# Compiled into one regex with a group per rule, so a message is scanned once.
+_HEURISTIC_RULES = (
+    ("timeout|502|504",
+     "Check upstream services and DB connection pool saturation. Retry or scale backend; look for request timeouts and 502/504 traces."),
+    ("connection reset|connection refused",
+     "Investigate network connectivity and DB availability. Check connection pool sizes and recent restarts."),
+    ("memory|oom",
+     "Inspect memory usage, OOM killer events and recent deployments. Consider increasing instance size or reducing memory usage."),
+    ("cpu",
+     "Check CPU hotspots, long-running queries or threads; examine top/ps output and APM traces."),
+    ("syntaxerror|traceback",
+     "A Python exception occurred during startup. Inspect the full traceback in logs and reproduce locally with `python app.py`."),
+)
+_HEURISTIC_PAT = re.compile("|".join(f"({kw})" for kw, _ in _HEURISTIC_RULES), re.IGNORECASE)
+
+def _heuristic_suggestion(msg):
+    """Suggestion for a message; deterministic, so repeated messages skip the regex scan."""
+    # memoize only messages up to PROMPT_MAX_CHARS, so the cache stays bounded in bytes too
+    if len(msg) <= PROMPT_MAX_CHARS:
+        return _heuristic_suggestion_cached(msg)
+    return _heuristic_scan(msg)
+
+def _heuristic_scan(msg):
+    # one case-insensitive pass over msg; the lowest-numbered rule that matches wins
+    best = None
+    for m in _HEURISTIC_PAT.finditer(msg):
+        if best is None or m.lastindex < best:
+            best = m.lastindex
+            if best == 1:
+                break
+    if best is not None:
+        return _HEURISTIC_RULES[best - 1][1]
+    return "Gather logs (traceIDs), check recent deploys, and reproduce the error locally with increased logging."
+
+_heuristic_suggestion_cached = lru_cache(maxsize=1024)(_heuristic_scan)
+
 def _local_heuristic(event_id, event_payload, event_meta):
     """Deterministic local fallback analysis (fast, safe)."""
     summary = f"Event {event_id}: local-heuristic analysis"
@@ -29,20 +156,7 @@ def _local_heuristic(event_id, event_payload, event_meta):
             msg = event_payload.get("message") or event_payload.get("msg") or str(event_payload)
         else:
             msg = str(event_payload or "")
-        lower = msg.lower()
-
-        if "timeout" in lower or "502" in lower or "504" in lower:
-            suggestion = "Check upstream services and DB connection pool saturation. Retry or scale backend; look for request timeouts and 502/504 traces."
-        elif "connection reset" in lower or "connection refused" in lower:
-            suggestion = "Investigate network connectivity and DB availability. Check connection pool sizes and recent restarts."
-        elif "memory" in lower or "oom" in lower:
-            suggestion = "Inspect memory usage, OOM killer events and recent deployments. Consider increasing instance size or reducing memory usage."
-        elif "cpu" in lower:
-            suggestion = "Check CPU hotspots, long-running queries or threads; examine top/ps output and APM traces."
-        elif "syntaxerror" in lower or "traceback" in lower:
-            suggestion = "A Python exception occurred during startup. Inspect the full traceback in logs and reproduce locally with `python app.py`."
-        else:
-            suggestion = "Gather logs (traceIDs), check recent deploys, and reproduce the error locally with increased logging."
+        suggestion = _heuristic_suggestion(msg)
 
         # build analysis text
         analysis = f"Local heuristic used due to missing AI response. Summary derived from payload: {msg}"
@@ -68,27 +182,31 @@ def _call_openai(event_id, event_payload, event_meta):
     payload_text = ""
     try:
         if isinstance(event_payload, (dict, list)):
-            payload_text = json.dumps(event_payload, ensure_ascii=False)
+            payload_text = _jdumps(_trim_payload(event_payload))
         else:
             payload_text = str(event_payload or "")
     except Exception:
         payload_text = str(event_payload or "")
+    if len(payload_text) > PROMPT_MAX_CHARS:
+        payload_text = payload_text[:PROMPT_MAX_CHARS] + " …[truncated]"
 
+    # The prompt (and so the answer) depends only on model, payload and meta; analyze_event_ai
+    # caches results on exactly those, so the event id must not be added here.
     prompt = f"""
 You are an incident detective. Analyze the event and return a short JSON object with two fields: "analysis" and "suggestion".
 Be concise: analysis (1-2 sentences) explains likely root cause or what the payload shows.
 Suggestion (1-3 actionable steps) lists immediate steps for triage or mitigation.
 
-Event ID: {event_id}
 Event payload: {payload_text}
-Event meta: {json.dumps(event_meta or {}, ensure_ascii=False)}
+Event meta: {_jdumps(event_meta or {})}
 Return only JSON with "analysis" and "suggestion".
 """
 
+    if not _openai_slots.acquire(timeout=1.0):
+        return None, "openai-concurrency-limit"
     try:
-        openai.api_key = key
-        # ChatCompletion or Responses API usage; fallback to ChatCompletion for wide compatibility
-        response = openai.ChatCompletion.create(
+        client = _get_client(key)
+        response = client.chat.completions.create(
             model=model,
             messages=[
                 {"role": "system", "content": "You are a helpful incident response assistant."},
@@ -99,8 +217,8 @@ Return only JSON with "analysis" and "suggestion".
         )
         # extract content
         content = ""
-        if response and "choices" in response and len(response["choices"]) > 0:
-            content = response["choices"][0]["message"]["content"].strip()
+        if response and response.choices:
+            content = (response.choices[0].message.content or "").strip()
         else:
             content = str(response)
 
@@ -110,7 +228,7 @@ Return only JSON with "analysis" and "suggestion".
         last_brace = content.rfind("}")
         json_text = content[first_brace:last_brace+1] if first_brace != -1 and last_brace != -1 else content
         try:
-            parsed = json.loads(json_text)
+            parsed = _jloads(json_text)
             analysis = parsed.get("analysis") or parsed.get("analysis_text") or parsed.get("explanation") or str(parsed)
             suggestion = parsed.get("suggestion") or parsed.get("suggestions") or parsed.get("recommendation") or ""
             return {"analysis": analysis, "suggestion": suggestion, "provider": "openai"}, None
@@ -121,16 +239,25 @@ Return only JSON with "analysis" and "suggestion".
     except Exception as e:
         logger.exception("OpenAI call failed: %s", e)
         return None, str(e)
+    finally:
+        _openai_slots.release()
 
 def analyze_event_ai(event_id, event_payload=None, event_meta=None):
     """
     Public callable used by app.py.
     Returns a dict: {"analysis":..., "suggestion":..., "provider":...} or raises.
     """
-    # 1) Try OpenAI path first (if possible)
+    # 1) Try OpenAI path first (if possible), answering repeats from the content cache
     try:
+        key = _cache_key(event_payload, event_meta)
+        if key is not None:
+            cached = _cache_get(key)
+            if cached is not None:
+                return cached
         res, err = _call_openai(event_id, event_payload, event_meta)
         if res:
+            if key is not None:
+                _cache_put(key, res)
             return res
         logger.info("openai path unavailable: %s - falling back to local heuristic", err)
     except Exception as e:
@@ -1,25 +1,83 @@
 # app.py - Nexus System (startup-safe, demo-friendly)
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request
 from datetime import datetime
 from sqlalchemy import text
-from sqlalchemy import text as _text
 import os
+import json
+import hashlib
 import logging
-import traceback
 import time
 import random
+import queue
+import threading
+
+# orjson is optional: faster JSON encoding when installed, stdlib json otherwise
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+# flask-compress is optional: brotli/gzip responses when installed, identity otherwise
+try:
+    from flask_compress import Compress
+except Exception:
+    Compress = None
 
 app = Flask(__name__)
 app.logger.setLevel(logging.INFO)
 
+if Compress is not None:
+    # dashboard HTML and JSON bodies; tiny responses are not worth the CPU
+    app.config.setdefault("COMPRESS_ALGORITHM", ["br", "gzip"])
+    app.config.setdefault("COMPRESS_MIN_SIZE", 512)
+    Compress(app)
+
+def _dumps(obj):
+    """Serialize obj to JSON bytes (orjson if available)."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str)
+    return json.dumps(obj, default=str).encode("utf-8")
+
+def ojson(obj, status=200):
+    """JSON response encoded with _dumps; used by the API routes instead of jsonify."""
+    return app.response_class(_dumps(obj), status=status, mimetype="application/json")
+
 # DB / SQLAlchemy lazy initialization to avoid import-time crash
 SessionLocal = None
 engine = None
 
+# SQLite tuning applied on every new DBAPI connection:
+# WAL + synchronous=NORMAL avoids the two fsyncs per commit of the default journal mode.
+_SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-65536",
+)
+
+def _set_sqlite_pragmas(dbapi_conn, conn_record):
+    cursor = dbapi_conn.cursor()
+    try:
+        for stmt in _SQLITE_PRAGMAS:
+            cursor.execute(stmt)
+    finally:
+        cursor.close()
+
+def _enable_sqlite_pragmas(eng):
+    """Attach _set_sqlite_pragmas to a SQLite engine (no-op for other dialects)."""
+    try:
+        if eng is not None and eng.dialect.name == "sqlite":
+            from sqlalchemy import event
+            event.listen(eng, "connect", _set_sqlite_pragmas)
+    except Exception as e:
+        app.logger.warning(f"could not enable SQLite pragmas: {e}")
+
 def init_db_engine():
     """
     Try to import engine from db.py (production).
-    If that fails, create an in-memory SQLite fallback (demo mode).
+    If that fails and no server DATABASE_URL is configured, create an in-memory
+    SQLite fallback (demo mode).
     This function is idempotent.
     """
     global engine, SessionLocal
@@ -28,137 +86,324 @@ def init_db_engine():
 
     # Try production engine import
     try:
-        from db import engine as imported_engine
-        from sqlalchemy.orm import sessionmaker as _sessionmaker
+        from db import engine as imported_engine, SessionLocal as imported_session
+        if imported_engine is None or imported_session is None:
+            raise RuntimeError("db.py did not initialize an engine")
         engine = imported_engine
-        SessionLocal = _sessionmaker(bind=engine)
-        app.logger.info("DB engine loaded from db.py")
+        _enable_sqlite_pragmas(engine)
+        SessionLocal = imported_session
+        # one shared pool per process (db.py); status shows its size/checked-out connections
+        app.logger.info(f"DB engine loaded from db.py, pool: {engine.pool.status()}")
+        _resolve_dialect()
+        _probe_schema()
         return
     except Exception as e:
         app.logger.warning(f"db import failed at startup: {e}")
 
+    # A configured server database that cannot be used stays unavailable (reported as degraded);
+    # silently switching to an empty in-memory database would hide the misconfiguration.
+    configured = os.getenv("DATABASE_URL")
+    if configured and not configured.startswith("sqlite"):
+        return
+
     # Fallback: in-memory SQLite (demo-only)
     try:
         from sqlalchemy import create_engine
-        from sqlalchemy.orm import sessionmaker as _sessionmaker
-        engine = create_engine("sqlite:///:memory:", echo=False, future=True)
-        SessionLocal = _sessionmaker(bind=engine)
+        from sqlalchemy.orm import sessionmaker as _sessionmaker, scoped_session as _scoped_session
+        from sqlalchemy.pool import StaticPool
+        # one shared connection: the per-thread default would give each thread/greenlet an empty database
+        engine = create_engine("sqlite:///:memory:", echo=False, future=True, poolclass=StaticPool,
+                               connect_args={"check_same_thread": False})
+        _enable_sqlite_pragmas(engine)
+        SessionLocal = _scoped_session(_sessionmaker(bind=engine, expire_on_commit=False))
         app.logger.info("Using fallback in-memory SQLite engine (demo mode)")
+        _resolve_dialect()
+        _probe_schema()
     except Exception as e:
         app.logger.error(f"Failed to create fallback DB engine: {e}")
         engine = None
         SessionLocal = None
 
+@app.teardown_appcontext
+def shutdown_session(exc=None):
+    """Release this thread's scoped Session at the end of each request."""
+    if SessionLocal is not None:
+        SessionLocal.remove()
+
+# Dialect resolved once by init_db_engine; picks the concrete suggestion writer too
+DB_IS_POSTGRES = False
+
+def _resolve_dialect():
+    global DB_IS_POSTGRES, _do_insert_suggestion, _SQL_UPSERT_EVENT
+    global _SQL_RECENT_SUGG
+    try:
+        DB_IS_POSTGRES = engine.dialect.name in ("postgresql", "postgres")
+    except Exception:
+        DB_IS_POSTGRES = str(getattr(engine, "url", "")).startswith("postgres")
+    _do_insert_suggestion = _pg_insert_fn if DB_IS_POSTGRES else _sqlite_insert_fn
+    _SQL_UPSERT_EVENT = _SQL_UPSERT_EVENT_PG if DB_IS_POSTGRES else _SQL_UPSERT_EVENT_SQLITE
+    _SQL_RECENT_SUGG = _SQL_RECENT_SUGG_PG if DB_IS_POSTGRES else _SQL_RECENT_SUGG_SQLITE
+
+# Schema state looked up once per process (see _probe_schema).
+# ensure_demo_tables() skips its DDL when every flag is True.
+_SCHEMA_STATE = {"checked": False, "events": False, "message": False, "ai_suggestions": False, "indexes": False}
+
+# Indexes for the hot read paths (same DDL on SQLite and Postgres)
+_DEMO_INDEXES = {
+    # /api/ai/suggestions: ORDER BY created_at DESC LIMIT 20
+    "ix_ai_suggestions_created_at": "CREATE INDEX IF NOT EXISTS ix_ai_suggestions_created_at ON ai_suggestions (created_at DESC)",
+}
+
+# Demo indexes whose DDL failed once (e.g. a legacy events table without created_at);
+# they are left out of the schema check and not retried on every request
+_SKIPPED_INDEXES = set()
+
+def _db_in_memory():
+    try:
+        return engine.url.database in (None, "", ":memory:")
+    except Exception:
+        return True
+
+def _db_shared_across_threads():
+    """
+    True when every thread sees the same database. In-memory SQLite only does on a StaticPool
+    (one connection); the default per-thread pool gives each thread its own empty database.
+    """
+    try:
+        from sqlalchemy.pool import StaticPool
+        return not _db_in_memory() or isinstance(engine.pool, StaticPool)
+    except Exception:
+        return False
+
+def _db_background_writes_ok():
+    """
+    True when background worker threads may write. Not for in-memory SQLite: its single shared
+    connection would interleave a worker's transaction with the request threads'.
+    """
+    return not _db_in_memory() and _db_shared_across_threads()
+
+def _probe_schema(force=False):
+    """
+    Check once whether events, events.message, ai_suggestions and _DEMO_INDEXES exist.
+    Postgres: a single round-trip (to_regclass + information_schema).
+    SQLite: PRAGMA table_info per table.
+    """
+    if _SCHEMA_STATE["checked"] and not force:
+        return _SCHEMA_STATE
+    if engine is None or SessionLocal is None or not _db_shared_across_threads():
+        return _SCHEMA_STATE
+    try:
+        with SessionLocal() as db:
+            if DB_IS_POSTGRES:
+                index_checks = "".join(f", to_regclass('{name}') IS NOT NULL"
+                                       for name in _DEMO_INDEXES if name not in _SKIPPED_INDEXES)
+                row = db.execute(text(
+                    "SELECT to_regclass('events') IS NOT NULL, "
+                    "to_regclass('ai_suggestions') IS NOT NULL, "
+                    "EXISTS (SELECT 1 FROM information_schema.columns "
+                    "WHERE table_name='events' AND column_name='message')" + index_checks
+                )).fetchone()
+                events_ok, sugg_ok, message_ok = bool(row[0]), bool(row[1]), bool(row[2])
+                indexes_ok = all(row[3:])
+            else:
+                event_cols = [r[1] for r in db.execute(text("PRAGMA table_info(events)")).fetchall()]
+                sugg_cols = db.execute(text("PRAGMA table_info(ai_suggestions)")).fetchall()
+                events_ok, sugg_ok, message_ok = bool(event_cols), bool(sugg_cols), "message" in event_cols
+                index_names = {r[0] for r in db.execute(text("SELECT name FROM sqlite_master WHERE type='index'")).fetchall()}
+                indexes_ok = all(name in index_names for name in _DEMO_INDEXES if name not in _SKIPPED_INDEXES)
+        _SCHEMA_STATE.update(checked=True, events=events_ok, message=message_ok, ai_suggestions=sugg_ok,
+                             indexes=indexes_ok)
+        app.logger.info(f"schema probe: {_SCHEMA_STATE}")
+    except Exception as e:
+        app.logger.warning(f"schema probe failed: {e}")
+    return _SCHEMA_STATE
+
 # --- helper: create demo tables in a dialect-aware way ---
 def ensure_demo_tables(db):
     """
     Create 'events' and 'ai_suggestions' tables using SQL that matches the DB dialect.
     Call with an open SessionLocal() context: `with SessionLocal() as db: ensure_demo_tables(db)`
+    No-op once _probe_schema() has seen both tables, events.message and the demo indexes.
     """
+    if _SCHEMA_STATE["events"] and _SCHEMA_STATE["message"] and _SCHEMA_STATE["ai_suggestions"] \
+            and _SCHEMA_STATE["indexes"]:
+        return
     try:
-        is_postgres = False
-        try:
-            is_postgres = getattr(engine, "dialect").name in ("postgresql", "postgres")
-        except Exception:
-            # fallback: inspect engine.url string
-            try:
-                is_postgres = str(getattr(engine, "url", "")).startswith("postgres")
-            except Exception:
-                is_postgres = False
-
-        if is_postgres:
+        if DB_IS_POSTGRES:
             # PostgreSQL-friendly DDL
-            db.execute(_text(
+            db.execute(text(
                 "CREATE TABLE IF NOT EXISTS events ("
                 "id TEXT PRIMARY KEY, event_type TEXT, message TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
             ))
-            db.execute(_text(
+            db.execute(text(
                 "CREATE TABLE IF NOT EXISTS ai_suggestions ("
                 "id TEXT PRIMARY KEY, event_id TEXT, title TEXT, body TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
             ))
         else:
             # SQLite / generic fallback
-            db.execute(_text(
+            db.execute(text(
                 "CREATE TABLE IF NOT EXISTS events ("
                 "id TEXT PRIMARY KEY, event_type TEXT, message TEXT, created_at DATETIME DEFAULT CURRENT_TIMESTAMP)"
             ))
-            db.execute(_text(
+            db.execute(text(
                 "CREATE TABLE IF NOT EXISTS ai_suggestions ("
                 "id INTEGER PRIMARY KEY AUTOINCREMENT, event_id TEXT, title TEXT, body TEXT, created_at DATETIME DEFAULT CURRENT_TIMESTAMP)"
             ))
+        # commit the DDL on its own so later rollbacks cannot undo it
+        db.commit()
+        # each index in its own transaction: on Postgres a failed statement aborts the whole transaction
+        for name, ddl in _DEMO_INDEXES.items():
+            if name in _SKIPPED_INDEXES:
+                continue
+            try:
+                db.execute(text(ddl))
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                _SKIPPED_INDEXES.add(name)
+                app.logger.warning(f"ensure_demo_tables: index {name} not created, not retrying: {e}")
+        if _db_shared_across_threads():
+            _probe_schema(force=True)
     except Exception as e:
+        # leave the caller's session usable (Postgres rejects every statement after an error until rollback)
+        db.rollback()
         app.logger.exception(f"ensure_demo_tables failed: {e}")
 
-# --- helper: insert AI suggestion in a dialect-resilient way ---
+# Statements built once at import and reused per request (SQLAlchemy caches their compiled form)
+_SQL_PING = text("SELECT 1")
+_SQL_ANY_EVENT = text("SELECT 1 FROM events LIMIT 1")
+_SQL_INSERT_EVENT = text("INSERT INTO events (id, event_type, message) VALUES (:id, :et, :msg)")
+_SQL_SELECT_EVENT = text("SELECT message FROM events WHERE id = :id")
+_SQL_INSERT_SUGG = text("INSERT INTO ai_suggestions (event_id, title, body) VALUES (:eid, :t, :b)")
+_SQL_INSERT_SUGG_ID = text("INSERT INTO ai_suggestions (id, event_id, title, body) VALUES (:id, :eid, :t, :b)")
+# Timestamps come back as "YYYY-MM-DD HH:MM:SS" text: SQLite stores CURRENT_TIMESTAMP in that form,
+# Postgres formats it with to_char, so rows go to JSON without a per-row datetime/str() step.
+_PG_TS = "to_char({col}, 'YYYY-MM-DD HH24:MI:SS')"
+# recent suggestions for /api/ai/suggestions
+_RECENT_SUGG_SQL = "SELECT id, event_id, title, body, {ts} AS ts FROM ai_suggestions ORDER BY ai_suggestions.created_at DESC LIMIT 20"
+_SQL_RECENT_SUGG_SQLITE = text(_RECENT_SUGG_SQL.format(ts="created_at"))
+_SQL_RECENT_SUGG_PG = text(_RECENT_SUGG_SQL.format(ts=_PG_TS.format(col="created_at")))
+_SQL_RECENT_SUGG = _SQL_RECENT_SUGG_SQLITE
+# events upsert: "INSERT OR REPLACE" is SQLite-only, Postgres needs ON CONFLICT (picked by _resolve_dialect)
+_SQL_UPSERT_EVENT_SQLITE = text("INSERT OR REPLACE INTO events (id, event_type, message) VALUES (:id, :et, :msg)")
+_SQL_UPSERT_EVENT_PG = text(
+    "INSERT INTO events (id, event_type, message) VALUES (:id, :et, :msg) "
+    "ON CONFLICT (id) DO UPDATE SET event_type = EXCLUDED.event_type, message = EXCLUDED.message"
+)
+_SQL_UPSERT_EVENT = _SQL_UPSERT_EVENT_SQLITE
+
+def _new_suggestion_id():
+    # random 48-bit id: a batch of rows created in the same millisecond must not collide on the PK
+    from models import gen_id
+    return gen_id("sugg")
+
+# --- helper: insert AI suggestion ---
+# One concrete writer per dialect; _resolve_dialect() binds _do_insert_suggestion to one of them.
+def _pg_insert_fn(db, event_id, title, body):
+    # demo Postgres schema uses a TEXT primary key without default, so supply the id
+    db.execute(_SQL_INSERT_SUGG_ID, {"id": _new_suggestion_id(), "eid": event_id, "t": title, "b": body})
+
+def _sqlite_insert_fn(db, event_id, title, body):
+    # INTEGER PRIMARY KEY AUTOINCREMENT fills the id
+    db.execute(_SQL_INSERT_SUGG, {"eid": event_id, "t": title, "b": body})
+
+_do_insert_suggestion = _sqlite_insert_fn
+
 def insert_ai_suggestion(db, event_id, title, body):
     """
-    Try to insert into ai_suggestions safely.
-    We try an INSERT with a generated id (string) first (Postgres that requires id),
-    then fallback to insert without id (if DB has autogenerate).
+    Insert one ai_suggestions row with the writer chosen for this dialect and commit.
     Returns (ok: bool, error: str|None)
     """
     try:
-        # detect postgres vs sqlite
-        is_postgres = False
+        _do_insert_suggestion(db, event_id, title, body)
+        db.commit()
+        _invalidate_suggestions()
+        return True, None
+    except Exception as e:
+        db.rollback()
+        app.logger.warning(f"insert_ai_suggestion failed: {e}")
+        return False, str(e)
+
+# --- background writer for AI suggestions (keeps the commit off the request path) ---
+PERSIST_BATCH = 32
+_persist_queue = queue.Queue(maxsize=256)
+_persist_thread = None
+_persist_lock = threading.Lock()
+
+def _persist_batch(batch):
+    """Write queued (event_id, title, body) tuples with one executemany; per-row fallback on error."""
+    with SessionLocal() as db:
+        ensure_demo_tables(db)
+        params = [{"eid": eid, "t": t, "b": b} for eid, t, b in batch]
         try:
-            is_postgres = getattr(engine, "dialect").name in ("postgresql", "postgres")
-        except Exception:
-            try:
-                is_postgres = str(getattr(engine, "url", "")).startswith("postgres")
-            except Exception:
-                is_postgres = False
-
-        # prepare params
-        # use a string id (safe for Postgres SERIAL or string PKs)
-        suggestion_id = f"sugg_{int(time.time()*1000)}_{random.randint(100,999)}"
-        params_with_id = {"id": suggestion_id, "eid": event_id, "t": title, "b": body}
-        params_no_id = {"eid": event_id, "t": title, "b": body}
-
-        # If Postgres, attempt insert with id first (avoid NOT NULL PK failure).
-        if is_postgres:
-            try:
-                db.execute(text("INSERT INTO ai_suggestions (id, event_id, title, body) VALUES (:id, :eid, :t, :b)"), params_with_id)
-                db.commit()
-                return True, None
-            except Exception as e:
-                db.rollback()
-                app.logger.warning(f"insert_ai_suggestion (with id) failed: {e}")
-                # fallback: try without id (maybe column defaults exist)
-                try:
-                    db.execute(text("INSERT INTO ai_suggestions (event_id, title, body) VALUES (:eid, :t, :b)"), params_no_id)
-                    db.commit()
-                    return True, None
-                except Exception as e2:
-                    db.rollback()
-                    app.logger.error(f"insert_ai_suggestion fallback failed: {e2}")
-                    return False, str(e2)
-        else:
-            # SQLite/general: try without id (autoincrement)
+            if DB_IS_POSTGRES:
+                for p in params:
+                    p["id"] = _new_suggestion_id()
+                db.execute(_SQL_INSERT_SUGG_ID, params)
+            else:
+                db.execute(_SQL_INSERT_SUGG, params)
+            db.commit()
+            _invalidate_suggestions()
+        except Exception as e:
+            db.rollback()
+            app.logger.warning(f"batched suggestion insert failed, retrying per row: {e}")
+            for eid, t, b in batch:
+                ok, err = insert_ai_suggestion(db, eid, t, b)
+                if not ok:
+                    app.logger.warning(f"suggestion persist failed for {eid}: {err}")
+
+def _persist_worker():
+    while True:
+        batch = [_persist_queue.get()]
+        while len(batch) < PERSIST_BATCH:
             try:
-                db.execute(text("INSERT INTO ai_suggestions (event_id, title, body) VALUES (:eid, :t, :b)"), params_no_id)
-                db.commit()
-                return True, None
-            except Exception as e:
-                db.rollback()
-                app.logger.warning(f"insert_ai_suggestion (sqlite) failed: {e}")
-                # as last resort, insert with a generated id into id column (if it's text primary key in non-sqlite)
-                try:
-                    db.execute(text("INSERT INTO ai_suggestions (id, event_id, title, body) VALUES (:id, :eid, :t, :b)"), params_with_id)
-                    db.commit()
-                    return True, None
-                except Exception as e2:
-                    db.rollback()
-                    app.logger.error(f"insert_ai_suggestion final fallback failed: {e2}")
-                    return False, str(e2)
-    except Exception as e_outer:
-        app.logger.exception(f"insert_ai_suggestion outer exception: {e_outer}")
-        return False, str(e_outer)
+                batch.append(_persist_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            _persist_batch(batch)
+        except Exception as e:
+            app.logger.exception(f"suggestion persist worker failed: {e}")
+
+def queue_ai_suggestion(event_id, title, body):
+    """
+    Hand a suggestion to the background writer (started lazily, one per process).
+    In-memory SQLite is written synchronously, on the request thread (see _db_background_writes_ok).
+    When the queue is full the suggestion is dropped rather than blocking the request.
+    Returns (ok: bool, error: str|None)
+    """
+    global _persist_thread
+    if SessionLocal is None:
+        return False, "DB not available"
 
+    if not _db_background_writes_ok():
+        try:
+            with SessionLocal() as db:
+                ensure_demo_tables(db)
+                return insert_ai_suggestion(db, event_id, title, body)
+        except Exception as e:
+            return False, str(e)
+
+    if _persist_thread is None:
+        with _persist_lock:
+            if _persist_thread is None:
+                _persist_thread = threading.Thread(target=_persist_worker, name="suggestion-writer", daemon=True)
+                _persist_thread.start()
+    try:
+        _persist_queue.put_nowait((event_id, title, body))
+        return True, None
+    except queue.Full:
+        return False, "persist queue full, suggestion dropped"
+
+_demo_seeded = False
 def seed_demo_events():
     """
     Seed a few demo events and suggestions when using the in-memory fallback.
-    Safe to call multiple times.
+    Safe to call multiple times; after the first success on a shared database it returns immediately.
     """
+    global _demo_seeded
+    if _demo_seeded:
+        return
     try:
         if SessionLocal is None:
             app.logger.warning("SessionLocal is None — skipping seed_demo_events")
@@ -168,11 +413,11 @@ def seed_demo_events():
             # dialect-aware table creation
             ensure_demo_tables(db)
 
-            # Check if already seeded (avoid duplicates)
-            row = db.execute(text("SELECT COUNT(1) as c FROM events")).fetchone()
-            count = row[0] if row else 0
-            if count > 0:
+            # Check if already seeded (avoid duplicates); existence only, no full COUNT scan
+            row = db.execute(_SQL_ANY_EVENT).fetchone()
+            if row is not None:
                 app.logger.info("Demo DB already seeded (events exist).")
+                _demo_seeded = _db_shared_across_threads()
                 return
 
             demo_rows = [
@@ -183,26 +428,28 @@ def seed_demo_events():
                 ("ev_demo_5", "INFO", "Synthetic event for demo: TraceID demo-1234")
             ]
             for _id, et, msg in demo_rows:
-                db.execute(text("INSERT INTO events (id, event_type, message) VALUES (:id, :et, :msg)"),
-                           {"id": _id, "et": et, "msg": msg})
+                db.execute(_SQL_INSERT_EVENT, {"id": _id, "et": et, "msg": msg})
             # add a simple ai suggestion row for one event - use helper
             ok, err = insert_ai_suggestion(db, "ev_demo_1", "Investigate DB timeout", "Check DB connections; restart DB pool if necessary.")
             if not ok:
                 app.logger.warning(f"seed_demo_events: failed to insert demo suggestion: {err}")
             db.commit()
+            _demo_seeded = _db_shared_across_threads()
             app.logger.info("Seeded demo events and ai_suggestions (5 events + 1 suggestion)")
     except Exception as e:
         app.logger.exception(f"seed_demo_events failed: {e}")
 
 # Lazy AI loader: keep analyze_event_ai None until first use
 analyze_event_ai = None
+_ai_router_attempted = False
 def ensure_ai_router_loaded():
     """
     Lazy import ai_router and set analyze_event_ai callable.
+    The import is attempted once per process; a failure is remembered.
     Returns callable or None.
     """
-    global analyze_event_ai
-    if analyze_event_ai is not None:
+    global analyze_event_ai, _ai_router_attempted
+    if analyze_event_ai is not None or _ai_router_attempted:
         return analyze_event_ai
     try:
         from ai_router import analyze_event_ai as _analyze
@@ -211,9 +458,47 @@ def ensure_ai_router_loaded():
     except Exception as e:
         analyze_event_ai = None
         app.logger.warning(f"ai_router import failed at runtime: {e}")
+    # mark only after the attempt finishes, so a concurrent caller never sees a half-done import as failed
+    _ai_router_attempted = True
     return analyze_event_ai
 
-# --- Dashboard (simple demo UI, templates/dashboard.html) ---
+# DB reachability shared by / and /health; the SELECT 1 probe runs at most once per DB_STATUS_TTL
+DB_STATUS_TTL = 5.0
+_DB_STATUS = {"t": 0.0, "ok": False}
+
+def _db_status():
+    now = time.time()
+    if now - _DB_STATUS["t"] < DB_STATUS_TTL:
+        return _DB_STATUS["ok"]
+    ok = False
+    try:
+        if SessionLocal:
+            with SessionLocal() as db:
+                db.execute(_SQL_PING).fetchone()
+                ok = True
+    except Exception as e:
+        app.logger.warning(f"DB quick-check failed: {e}")
+    _DB_STATUS["ok"] = ok
+    _DB_STATUS["t"] = now
+    return ok
+
+# The dashboard page is static markup (static/index.html); all live data comes from the JSON APIs it polls.
+# Browsers/CDNs may reuse it for DASHBOARD_MAX_AGE seconds and revalidate with the ETag afterwards.
+DASHBOARD_MAX_AGE = int(os.environ.get("DASHBOARD_MAX_AGE", "60"))
+# File bytes kept in memory (re-read when the mtime changes). Served as a plain, non-streamed
+# response so flask-compress can compress it, tag the ETag with the encoding and answer 304s.
+_DASHBOARD_PAGE = {"mtime": None, "body": b"", "etag": ""}
+
+def _dashboard_page():
+    path = os.path.join(app.static_folder, "index.html")
+    mtime = os.stat(path).st_mtime
+    if mtime != _DASHBOARD_PAGE["mtime"]:
+        with open(path, "rb") as f:
+            body = f.read()
+        _DASHBOARD_PAGE.update(mtime=mtime, body=body, etag=hashlib.sha1(body).hexdigest())
+    return _DASHBOARD_PAGE
+
+# --- Dashboard (simple demo UI, static/index.html) ---
 @app.route('/')
 def dashboard():
     init_db_engine()
@@ -223,46 +508,24 @@ def dashboard():
         if engine is not None and str(getattr(engine, "url", "")).startswith("sqlite") and demo_seed_flag:
             seed_demo_events()
     except Exception:
+        import traceback
         app.logger.debug("seed_demo check failed: " + traceback.format_exc())
 
-    snapshot = {
-        "time": datetime.utcnow().isoformat(),
-        "ok": False,
-        "db": False,
-    }
-
-    # best-effort DB quick-check (non-blocking)
-    try:
-        if SessionLocal:
-            with SessionLocal() as db:
-                _ = db.execute(text("SELECT 1")).fetchone()
-                snapshot["db"] = True
-                snapshot["ok"] = True
-    except Exception as e:
-        app.logger.warning(f"DB quick-check failed: {e}")
-        snapshot["db"] = False
-        snapshot["ok"] = False
-
-    alerts = [
-        {"level": "Warning", "msg": "High CPU on Node 3", "age": "2m"},
-        {"level": "Info", "msg": "Firmware deploy success", "age": "1h"},
-    ]
-
-    return render_template('dashboard.html', title='Nexus System Dashboard', snapshot=snapshot, alerts=alerts)
+    page = _dashboard_page()
+    resp = Response(page["body"], mimetype="text/html")
+    resp.set_etag(page["etag"])
+    resp.last_modified = page["mtime"]
+    resp.cache_control.public = True
+    resp.cache_control.max_age = DASHBOARD_MAX_AGE
+    # identity requests are answered here; compressed ones again by flask-compress (encoding-tagged ETag)
+    return resp.make_conditional(request)
 
 # --- Health endpoint ---
 @app.route('/health')
 def health():
     init_db_engine()
-    ok = False
-    try:
-        if SessionLocal:
-            with SessionLocal() as db:
-                _ = db.execute(text("SELECT 1")).fetchone()
-                ok = True
-    except Exception:
-        ok = False
-    return jsonify(status='ok' if ok else 'degraded', db=bool(SessionLocal and ok)), 200
+    ok = _db_status()
+    return ojson({"status": "ok" if ok else "degraded", "db": bool(SessionLocal and ok)}, 200)
 
 # --- create / persist a sample event for demo (GET/POST) ---
 @app.route('/api/create_sample', methods=['GET', 'POST'])
@@ -282,13 +545,12 @@ def create_sample():
             with SessionLocal() as db:
                 # ensure tables exist and then insert
                 ensure_demo_tables(db)
-                db.execute(text("INSERT OR REPLACE INTO events (id, event_type, message) VALUES (:id, :et, :msg)"),
-                           {"id": sample["id"], "et": "ERROR", "msg": str(sample["payload"] )})
+                db.execute(_SQL_UPSERT_EVENT, {"id": sample["id"], "et": "ERROR", "msg": str(sample["payload"] )})
                 db.commit()
     except Exception as e:
         app.logger.warning(f"Create-sample persistence failed: {e}")
 
-    return jsonify(ok=True, event=sample), 200
+    return ojson({"ok": True, "event": sample}, 200)
 
 # --- Minimal ingest endpoint to populate the demo dashboard ---
 @app.route("/api/ingest", methods=["POST"])
@@ -302,31 +564,75 @@ def api_ingest():
     payload = request.get_json(silent=True) or {}
     event_type = payload.get("event_type", "INFO")
     message = payload.get("message", "Synthetic ingest event from demo UI")
-    event_id = payload.get("id") or f"ev_manual_{int(datetime.utcnow().timestamp())}"
+    now = int(time.time())
+    event_id = payload.get("id") or f"ev_manual_{now}"
 
     try:
         if SessionLocal is None:
-            return jsonify({"ok": False, "error": "DB not available"}), 500
+            return ojson({"ok": False, "error": "DB not available"}, 500)
 
         with SessionLocal() as db:
             ensure_demo_tables(db)
-            db.execute(text("INSERT OR REPLACE INTO events (id, event_type, message) VALUES (:id, :et, :msg)"),
-                       {"id": event_id, "et": event_type, "msg": message})
+            db.execute(_SQL_UPSERT_EVENT, {"id": event_id, "et": event_type, "msg": message})
             db.commit()
 
-            # create a simple AI suggestion row (simulated)
-            sim_title = f"{event_type} - Demo Suggestion"
-            sim_body = f"Simulated: check logs for recent {event_type} events. TraceID: demo-{int(datetime.utcnow().timestamp())}"
-            ok, err = insert_ai_suggestion(db, event_id, sim_title, sim_body)
-            if not ok:
-                app.logger.warning(f"api_ingest: failed to persist suggestion: {err}")
-            db.commit()
+        # create a simple AI suggestion row (simulated), persisted in the background
+        sim_title = f"{event_type} - Demo Suggestion"
+        sim_body = f"Simulated: check logs for recent {event_type} events. TraceID: demo-{now}"
+        ok, err = queue_ai_suggestion(event_id, sim_title, sim_body)
+        if not ok:
+            app.logger.warning(f"api_ingest: failed to persist suggestion: {err}")
 
         suggestion = {"suggestion": sim_body, "action": "Check application logs and restart service if persistent."}
-        return jsonify({"ok": True, "event_id": event_id, "suggestion": suggestion}), 201
+        return ojson({"ok": True, "event_id": event_id, "suggestion": suggestion}, 201)
     except Exception as e:
         app.logger.exception(f"api_ingest failed: {e}")
-        return jsonify({"ok": False, "error": str(e)}), 500
+        return ojson({"ok": False, "error": str(e)}, 500)
+
+# --- Batch ingest: many events, one executemany + one commit ---
+INGEST_BATCH_MAX = 1000
+
+@app.route("/api/ingest/events", methods=["POST"])
+def api_ingest_batch():
+    """
+    Batch ingest for log agents. Body: JSON array of {"id"?, "event_type"?, "message"?}.
+    All rows are written with a single executemany and one commit.
+    No AI analysis is queued; use /api/ai/suggest for events that need it.
+    """
+    init_db_engine()
+    items = request.get_json(silent=True)
+    if not isinstance(items, list):
+        return ojson({"ok": False, "error": "expected a JSON array of events"}, 400)
+    if len(items) > INGEST_BATCH_MAX:
+        return ojson({"ok": False, "error": f"too many events (max {INGEST_BATCH_MAX})"}, 413)
+    if not all(isinstance(e, dict) for e in items):
+        return ojson({"ok": False, "error": "each event must be a JSON object"}, 400)
+
+    try:
+        from models import gen_id
+        rows = [{"id": e.get("id") or gen_id("ev"),
+                 "et": e.get("event_type", "INFO"),
+                 "msg": e.get("message", "")} for e in items]
+        if SessionLocal is None:
+            return ojson({"ok": False, "error": "DB not available"}, 500)
+        if rows:
+            with SessionLocal() as db:
+                ensure_demo_tables(db)
+                db.execute(_SQL_UPSERT_EVENT, rows)
+                db.commit()
+        return ojson({"ok": True, "count": len(rows), "event_ids": [r["id"] for r in rows]}, 201)
+    except Exception as e:
+        app.logger.exception(f"api_ingest_batch failed: {e}")
+        return ojson({"ok": False, "error": str(e)}, 500)
+
+# Recent suggestions, reused for SUGGESTIONS_TTL seconds; any suggestion write clears it.
+# Writers also bump "version", so a read that overlapped a write does not cache its stale rows.
+SUGGESTIONS_TTL = 30.0
+_SUGGESTIONS_CACHE = {"t": 0.0, "rows": None, "version": 0}
+
+def _invalidate_suggestions():
+    _SUGGESTIONS_CACHE["version"] += 1
+    _SUGGESTIONS_CACHE["t"] = 0.0
 
 # -------------------------
 # Add this GET endpoint to expose stored AI suggestions to the frontend
@@ -335,15 +641,21 @@ def api_ingest():
 def api_ai_suggestions():
     """
     Return recent AI suggestions (best-effort).
+    Served from a short TTL cache; pass ?refresh=1 to read the DB now.
     """
     init_db_engine()
+    now = time.time()
+    if request.args.get("refresh") != "1" and _SUGGESTIONS_CACHE["rows"] is not None \
+            and now - _SUGGESTIONS_CACHE["t"] < SUGGESTIONS_TTL:
+        return ojson({"ok": True, "suggestions": _SUGGESTIONS_CACHE["rows"]}, 200)
+    version = _SUGGESTIONS_CACHE["version"]
     try:
         if SessionLocal is None:
-            return jsonify(ok=False, error="DB not available"), 500
+            return ojson({"ok": False, "error": "DB not available"}, 500)
 
         with SessionLocal() as db:
             ensure_demo_tables(db)
-            rows = db.execute(text("SELECT id, event_id, title, body, created_at FROM ai_suggestions ORDER BY created_at DESC LIMIT 20")).fetchall()
+            rows = db.execute(_SQL_RECENT_SUGG).fetchall()
             suggestions = []
             for r in rows:
                 suggestions.append({
@@ -351,31 +663,73 @@ def api_ai_suggestions():
                     "event_id": r[1],
                     "title": r[2],
                     "body": r[3],
-                    "created_at": str(r[4])
+                    "created_at": r[4]
                 })
-        return jsonify(ok=True, suggestions=suggestions), 200
+        if _SUGGESTIONS_CACHE["version"] == version:
+            _SUGGESTIONS_CACHE["rows"] = suggestions
+            _SUGGESTIONS_CACHE["t"] = now
+        return ojson({"ok": True, "suggestions": suggestions}, 200)
     except Exception as e:
         app.logger.exception(f"api_ai_suggestions failed: {e}")
-        return jsonify(ok=False, error=str(e)), 500
+        return ojson({"ok": False, "error": str(e)}, 500)
 
-# --- route: metrics (GET) ---
-@app.route('/api/metrics', methods=['GET'])
-def api_metrics():
+# /api/metrics body, rebuilt every METRICS_TTL seconds by a background thread
+# (started on first request, one per process); the route only returns the bytes
+METRICS_TTL = 1.0
+_METRICS_SNAPSHOT = {"body": None}
+_metrics_thread = None
+_metrics_lock = threading.Lock()
+
+def _build_metrics_body(rng=random):
     now = int(time.time())
-    labels = []
-    cpu = []
-    mem = []
-    for i in range(10):
-        labels.append(now - (9 - i) * 5)
-        cpu.append(round(random.uniform(10, 50), 2))
-        mem.append(round(random.uniform(20, 70), 2))
-    return jsonify({
+    uniform = rng.uniform
+    labels = list(range(now - 45, now + 1, 5))
+    cpu = [round(uniform(10, 50), 2) for _ in range(10)]
+    mem = [round(uniform(20, 70), 2) for _ in range(10)]
+    return _dumps({
         "ok": True,
         "time": datetime.utcnow().isoformat(),
         "series": {"labels": labels, "cpu": cpu, "mem": mem},
         "db": True if SessionLocal else False
     })
 
+def _metrics_refresher():
+    # the refresher owns its generator, so it never shares the module-level random state with requests
+    rng = random.Random()
+    while True:
+        time.sleep(METRICS_TTL)
+        try:
+            _METRICS_SNAPSHOT["body"] = _build_metrics_body(rng)
+        except Exception as e:
+            app.logger.warning(f"metrics refresh failed: {e}")
+
+# --- route: metrics (GET) ---
+@app.route('/api/metrics', methods=['GET'])
+def api_metrics():
+    global _metrics_thread
+    if _metrics_thread is None:
+        with _metrics_lock:
+            if _metrics_thread is None:
+                _METRICS_SNAPSHOT["body"] = _build_metrics_body()
+                _metrics_thread = threading.Thread(target=_metrics_refresher, name="metrics-refresh", daemon=True)
+                _metrics_thread.start()
+    return Response(_METRICS_SNAPSHOT["body"], mimetype="application/json")
+
+def _metrics_fast_path(wsgi_app):
+    """
+    WSGI shortcut: once the refresher is running, GET /api/metrics is answered with the snapshot
+    bytes before Flask builds a request context. The first request still goes through the route above.
+    """
+    def middleware(environ, start_response):
+        body = _METRICS_SNAPSHOT["body"]
+        if body is not None and environ.get("PATH_INFO") == "/api/metrics" and environ.get("REQUEST_METHOD") == "GET":
+            start_response("200 OK", [("Content-Type", "application/json"), ("Content-Length", str(len(body)))])
+            return [body]
+        return wsgi_app(environ, start_response)
+    return middleware
+
+app.wsgi_app = _metrics_fast_path(app.wsgi_app)
+
 # --- AI suggest endpoint (uses analyze_event_ai if available, else local heuristic) ---
 @app.route('/api/ai/suggest', methods=['POST'])
 def api_ai_suggest():
@@ -383,24 +737,23 @@ def api_ai_suggest():
     body = request.get_json(force=True) or {}
     event_id = body.get("event_id") or body.get("eventId") or body.get("id")
     if not event_id:
-        return jsonify(ok=False, error="missing event_id"), 400
-
-    event_payload = None
-    event_meta = None
-    # Try to fetch event from DB (best-effort)
-    try:
-        if SessionLocal:
-            with SessionLocal() as db:
-                # Try fetch event row
-                row = db.execute(text("SELECT message FROM events WHERE id = :id"), {"id": event_id}).fetchone()
-                if row:
-                    event_payload = row[0]
-    except Exception as e:
-        app.logger.warning(f"Failed to read event from DB: {e}")
+        return ojson({"ok": False, "error": "missing event_id"}, 400)
 
     # Try lazy load ai_router
     ai_callable = ensure_ai_router_loaded()
     if ai_callable:
+        event_payload = None
+        event_meta = None
+        # Try to fetch event from DB (best-effort)
+        try:
+            if SessionLocal:
+                with SessionLocal() as db:
+                    # Try fetch event row
+                    row = db.execute(_SQL_SELECT_EVENT, {"id": event_id}).mappings().first()
+                    event_payload = row["message"] if row else None
+        except Exception as e:
+            app.logger.warning(f"Failed to read event from DB: {e}")
+
         try:
             res = ai_callable(event_id=event_id, event_payload=event_payload, event_meta=event_meta)
             # Expect res to be dict-like; if string, wrap it
@@ -410,24 +763,17 @@ def api_ai_suggest():
             app.logger.warning(f"analyze_event_ai failed at runtime: {e}")
             res = {"analysis": "ai runtime error", "suggestion": "AI unavailable", "provider": "none"}
     else:
-        # Local heuristic fallback
+        # Local heuristic fallback (ignores the payload, so the event is not read)
         summary = f"Event {event_id}: local-heuristic analysis"
         suggestion = "No clear pattern from payload. Inspect logs with correlationId for RCA."
         res = {"analysis": summary, "suggestion": suggestion, "provider": "local-heuristic"}
 
-    # optional persist suggestion (best-effort)
-    try:
-        if SessionLocal:
-            with SessionLocal() as db:
-                ensure_demo_tables(db)
-                ok, err = insert_ai_suggestion(db, event_id, f"{res.get('provider')} suggestion", res.get("suggestion"))
-                if not ok:
-                    app.logger.warning(f"api_ai_suggest: failed to persist suggestion: {err}")
-                db.commit()
-    except Exception as e:
-        app.logger.warning(f"Failed to persist AISuggestion: {e}")
+    # optional persist suggestion (best-effort, background writer)
+    ok, err = queue_ai_suggestion(event_id, f"{res.get('provider')} suggestion", res.get("suggestion"))
+    if not ok:
+        app.logger.warning(f"api_ai_suggest: failed to persist suggestion: {err}")
 
-    return jsonify(ok=True, **res), 200
+    return ojson({"ok": True, **res}, 200)
 
 # ----------------- TEMP: DB migration helper (events table) -----------------
 @app.route('/admin/fix_events_table', methods=['POST'])
@@ -441,11 +787,11 @@ def admin_fix_events_table():
     secret = os.environ.get("MIGRATE_SECRET", "")
     q = request.args.get("secret") or request.form.get("secret")
     if not secret or q != secret:
-        return jsonify(ok=False, error="missing/invalid secret"), 401
+        return ojson({"ok": False, "error": "missing/invalid secret"}, 401)
 
     init_db_engine()
     if SessionLocal is None:
-        return jsonify(ok=False, error="DB not available"), 500
+        return ojson({"ok": False, "error": "DB not available"}, 500)
 
     results = []
     try:
@@ -460,13 +806,7 @@ def admin_fix_events_table():
                 results.append({"stmt": "ALTER TABLE (add) failed, will continue", "error": str(e_add)})
 
             # 2) If column 'msg' exists, copy into 'message' (Postgres: DO $$ ... END $$; else best-effort)
-            is_postgres = False
-            try:
-                is_postgres = getattr(db.bind.dialect, "name", "") == "postgresql"
-            except Exception:
-                is_postgres = False
-
-            if is_postgres:
+            if DB_IS_POSTGRES:
                 copy_sql = """
 DO $$
 BEGIN
@@ -482,4 +822,48 @@ END$$;
                     db.execute(text(copy_sql))
                     results.append({"stmt": "Postgres copy executed"})
                 except Exception as e:
-                    results.append({"stmt": "P
+                    results.append({"stmt": "Postgres copy failed", "error": str(e)})
+            else:
+                # SQLite / generic: copy only when a 'msg' column is present
+                try:
+                    cols = [r[1] for r in db.execute(text("PRAGMA table_info(events)")).fetchall()]
+                    if "msg" in cols:
+                        db.execute(text("UPDATE events SET message = msg WHERE message IS NULL AND msg IS NOT NULL"))
+                        results.append({"stmt": "SQLite copy executed"})
+                    else:
+                        results.append({"stmt": "no 'msg' column, copy skipped"})
+                except Exception as e:
+                    results.append({"stmt": "SQLite copy failed", "error": str(e)})
+
+            db.commit()
+
+        # schema changed: refresh the cached probe
+        _probe_schema(force=True)
+        return ojson({"ok": True, "results": results}, 200)
+    except Exception as e:
+        app.logger.exception(f"admin_fix_events_table failed: {e}")
+        return ojson({"ok": False, "error": str(e), "results": results}, 500)
+
+# --- CLI: create schema ahead of time (`flask --app app init-db`) ---
+@app.cli.command('init-db')
+def init_db_command():
+    """Create the demo tables and indexes once (and analyze them), so workers skip the DDL at request time."""
+    init_db_engine()
+    if SessionLocal is None:
+        raise SystemExit("DB not available")
+    with SessionLocal() as db:
+        ensure_demo_tables(db)
+        # fresh planner stats, so new tables are not planned from defaults until autovacuum gets to them
+        db.execute(text("ANALYZE events"))
+        db.execute(text("ANALYZE ai_suggestions"))
+        db.commit()
+    print(f"schema ready: {_probe_schema(force=True)}")
+
+# --- Error pages ---
+@app.errorhandler(404)
+def not_found(e):
+    return render_template('error.html', error_code=404), 404
+
+if __name__ == "__main__":
+    port = int(os.environ.get("PORT", 8080))
+    app.run(host="0.0.0.0", port=port)
@@ -2,7 +2,9 @@
 import os
 import logging
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker, scoped_session, declarative_base
+from sqlalchemy.pool import StaticPool
 
 # Logger setup
 logger = logging.getLogger("db")
@@ -19,14 +21,52 @@ if not DATABASE_URL:
     DATABASE_URL = "sqlite:///:memory:"
     logger.warning("DATABASE_URL not set, using in-memory SQLite engine (demo mode)")
 
-try:
-    engine = create_engine(
-        DATABASE_URL,
-        echo=False,
-        pool_pre_ping=True,
-        future=True,
+def _env_int(name, default):
+    """Integer env setting; a malformed value logs a warning and uses the default."""
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        logger.warning(f"Invalid {name}={raw!r}, using {default}")
+        return default
+
+# Pool sizing only applies to server databases (SQLite uses its own single-connection pools)
+engine_kwargs = {"echo": False, "pool_pre_ping": True, "future": True}
+if DATABASE_URL.startswith("sqlite"):
+    # pooled SQLite connections are handed to request threads, greenlets and the background writer;
+    # WAL/synchronous PRAGMAs are set per connection in app.py
+    engine_kwargs["connect_args"] = {"check_same_thread": False}
+    if make_url(DATABASE_URL).database in (None, "", ":memory:"):
+        # in-memory: one shared connection, otherwise every thread (greenlet under gevent)
+        # would get its own empty database from the default per-thread pool
+        engine_kwargs["poolclass"] = StaticPool
+else:
+    # per worker process: keep warm connections for reuse, cap bursts so
+    # workers x (pool_size + max_overflow) stays under the server's connection limit
+    engine_kwargs.update(
+        pool_size=_env_int("DB_POOL_SIZE", 20),
+        max_overflow=_env_int("DB_MAX_OVERFLOW", 10),
+        pool_recycle=_env_int("DB_POOL_RECYCLE", 1800),
     )
-    SessionLocal = sessionmaker(bind=engine)
+    # psycopg (v3) can PREPARE statements server-side once they have run DB_PREPARE_THRESHOLD times
+    # on a connection, so the hot demo queries skip parse/plan; set it to "none" behind pgbouncer
+    # (transaction pooling). psycopg2 has no server-side prepare.
+    try:
+        driver = make_url(DATABASE_URL).get_driver_name()
+    except Exception:
+        driver = None
+    if driver == "psycopg":
+        threshold = os.getenv("DB_PREPARE_THRESHOLD", "1")
+        engine_kwargs["connect_args"] = {
+            "prepare_threshold": None if threshold.lower() == "none" else _env_int("DB_PREPARE_THRESHOLD", 1)
+        }
+
+try:
+    engine = create_engine(DATABASE_URL, **engine_kwargs)
+    # One Session per thread, reused across requests; app.py removes it on app-context teardown
+    SessionLocal = scoped_session(sessionmaker(bind=engine, expire_on_commit=False))
     logger.info(f"Database engine initialized successfully: {DATABASE_URL}")
 except Exception as e:
     logger.error(f"Failed to initialize database engine: {e}")
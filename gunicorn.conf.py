@@ -0,0 +1,21 @@
+# gunicorn.conf.py - worker settings shared by Procfile and Dockerfile
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+
+# The app is I/O-bound (DB + OpenAI HTTPS): gevent workers multiplex many requests per process.
+# gunicorn's gevent worker runs monkey.patch_all() itself before loading app.py.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gevent")
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", "1000"))
+
+
+def post_worker_init(worker):
+    """psycopg2 is a C extension: install psycogreen's wait callback so its socket waits yield."""
+    if worker_class != "gevent":
+        return
+    try:
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+    except ImportError:
+        worker.log.warning("psycogreen not installed; psycopg2 calls will block the gevent hub")
@@ -1,19 +1,45 @@
 # models.py - Nexus System DB models (clean, explicit names)
-import uuid
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, String, DateTime, Boolean, JSON, func, Text
+import os
+import threading
+from sqlalchemy import Column, String, DateTime, Boolean, JSON, func, Text, Index, BigInteger, Integer
 
-Base = declarative_base()
+# one declarative registry for the app: the Base defined next to the engine in db.py
+from db import Base
+
+# gen_id draws from one process-wide block of os.urandom bytes instead of one uuid4() (one syscall) per id.
+# Process-wide, not thread-local: under gevent a thread-local is per greenlet, i.e. per request.
+_ID_BYTES = 6                  # 12 hex chars, as before
+_ID_BLOCK = _ID_BYTES * 1024   # ids per urandom read
+_id_buf = {"buf": b"", "pos": 0}
+_id_lock = threading.Lock()
+
+def _reset_id_buf():
+    # a forked worker must not hand out the rest of its parent's block (or inherit a held lock)
+    global _id_lock
+    _id_lock = threading.Lock()
+    _id_buf.update(buf=b"", pos=0)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_id_buf)
 
 def gen_id(prefix="ev"):
     """Generate short readable id: prefix_hex12"""
-    return f"{prefix}_{uuid.uuid4().hex[:12]}"
+    with _id_lock:
+        buf, pos = _id_buf["buf"], _id_buf["pos"]
+        if pos + _ID_BYTES > len(buf):
+            buf = _id_buf["buf"] = os.urandom(_ID_BLOCK)
+            pos = 0
+        _id_buf["pos"] = pos + _ID_BYTES
+    return f"{prefix}_{buf[pos:pos + _ID_BYTES].hex()}"
 
 class Event(Base):
     __tablename__ = "events"
 
-    id = Column(String, primary_key=True, default=lambda: gen_id("ev"))
-    tenant_id = Column(String, index=True, nullable=True)   # optional for demo
+    # compact 8-byte PK for the hot table (SQLite only auto-increments INTEGER PRIMARY KEY);
+    # the readable id for external references lives in public_id
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    public_id = Column(String(20), unique=True, nullable=False, default=lambda: gen_id("ev"))
+    tenant_id = Column(String, nullable=True)   # optional for demo; indexed via ix_events_tenant_ts
     service = Column(String, index=True, nullable=True)     # optional for demo
     ts = Column(DateTime(timezone=True), server_default=func.now())
     type = Column(String, nullable=True)
@@ -22,8 +48,13 @@ class Event(Base):
     payload = Column(JSON, nullable=True)
     processed = Column(Boolean, default=False)
 
+    __table_args__ = (
+        # time-scoped tenant queries: WHERE tenant_id = ? ORDER BY ts DESC
+        Index("ix_events_tenant_ts", "tenant_id", ts.desc()),
+    )
+
     def __repr__(self):
-        return f"<Event id={self.id} service={self.service} ts={self.ts}>"
+        return f"<Event id={self.id} public_id={self.public_id} service={self.service} ts={self.ts}>"
 
 class Incident(Base):
     __tablename__ = "incidents"
@@ -44,7 +75,7 @@ class AISuggestion(Base):
 
     id = Column(String, primary_key=True, default=lambda: gen_id("as"))
     event_id = Column(String, index=True, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     analysis = Column(Text, nullable=True)       # AI analysis summary
     suggestion = Column(Text, nullable=True)     # AI suggestion / action items
     provider = Column(String, default="openai", nullable=True)